@@ -6,25 +6,32 @@ Main script to run the Bayesian Optimization.
 This script defines the search space for the optimizer, runs the optimization loop,
 prints the best-found material and device parameters, and plots the results.
 
-NOTE: This script requires scikit-optimize and matplotlib.
-Install with: pip install scikit-optimize matplotlib
+NOTE: This script requires scikit-optimize, joblib, numba and matplotlib.
+Install with: pip install scikit-optimize joblib numba matplotlib
 """
 
+import argparse
+import logging
+import os
+import time
+import warnings
 import numpy as np
 
 # --- Imports for Bayesian Optimization ---
-from skopt import gp_minimize
+from skopt import Optimizer
 from skopt.space import Real, Integer, Categorical
-from skopt.utils import use_named_args
 from skopt.plots import plot_convergence
+from joblib import dump, load
 
 # --- Imports for Plotting ---
 import matplotlib.pyplot as plt
 
-from src.simulator import simulate
-from src.types import Params, Material, Sourcing, KPIs
+from src.simulator import simulate_batch
+from src.types import Params, Material, Sourcing, KPIs, KPIValues
 from src.materials import MATERIALS_DATABASE
 
+logger = logging.getLogger(__name__)
+
 # --- 1. Define Search Space for the Optimizer ---
 searchable_materials = [
     m for m in MATERIALS_DATABASE.keys() 
@@ -38,18 +45,146 @@ space  = [
     Real(0.05, 0.5, name='Gamma')
 ]
 
+# Total number of objective evaluations, and how many points are proposed per
+# ask/tell round. A round's points are simulated together with one
+# simulate_batch() call. A simulation takes tens of microseconds, so the run
+# time goes into refitting the surrogate and optimizing the acquisition
+# function once per round; larger batches trade some sample efficiency for
+# fewer refits.
+N_CALLS = 200
+BATCH_SIZE = 8
+
+# Intensity-sweep resolution used while optimizing. The knee is interpolated
+# inside the interval where the response crosses its midpoint, so on 5000
+# random devices 64 points give the same top-10 ranking as a 3000-point sweep
+# (scores within 1.3% at the 99th percentile; strongly oscillating MZI
+# responses can alias to another fringe, as they do at 300 points). The
+# N_FINALISTS best points are re-simulated at full resolution to pick and
+# report the result.
+N_I_SEARCH = 64
+N_FINALISTS = 5
+
+# How a batch of BATCH_SIZE distinct points is proposed from one surrogate:
+# 'cl_min' (minimum constant liar) temporarily "tells" each proposed point the
+# best value seen so far before asking for the next one, which spreads the
+# batch out while staying close to the current optimum.
+ASK_STRATEGY = 'cl_min'
+
+# Surrogate model. 'GBRT' is much cheaper to refit than 'GP' (whose fit is
+# O(n^3) in the number of observations) and scales better with batch size,
+# at the cost of less calibrated uncertainty estimates. Use 'GP' for small
+# budgets where the surrogate fit is not the bottleneck.
+BASE_ESTIMATOR = 'GBRT'
+
+# Acquisition function. 'EIps' (expected improvement per second) also models
+# how long each point takes to simulate and favours cheap points when their
+# expected improvement is similar; the objective returns (value, seconds).
+# With vectorized batches the points are not timed individually: each gets an
+# equal share of its batch's time, so the cost model only sees batch-to-batch
+# noise, has nothing per-point to learn, and EIps then ranks points as plain
+# 'EI' does. It only becomes informative if objective_batch times each point.
+ACQ_FUNC = 'EIps'
+
+# The evaluations made so far are saved here after every batch. If the file
+# exists at startup the run resumes from it, so a crash (or a larger N_CALLS)
+# does not cost the evaluations already made. Delete it to start a fresh
+# campaign.
+CHECKPOINT_PATH = "optimizer_checkpoint.pkl"
+
 # --- 2. Create the Objective Function for the Optimizer ---
-@use_named_args(space)
-def objective_function(**params_dict):
-    params_dict['material'] = Material(params_dict['material'])
-    params = Params(**params_dict)
-    kpis = simulate(params)
+def _score(params: Params, kpis: KPIValues) -> float:
+    """Figure of merit to maximize: contrast per unit switching energy."""
     if kpis.E_sw_pJ is not None and kpis.E_sw_pJ > 1e-9:
         score = kpis.contrast / kpis.E_sw_pJ
     else:
         score = 0.0
-    print(f"  - Simulating: {params.material.value}, Layers: {params.layers}, Lambda: {params.lambda_nm}nm, Q: {params.Q:.1f}, Gamma: {params.Gamma:.2f} -> Score: {score:.4e}")
-    return -score
+    # Per-evaluation output is debug-only (see --verbose), to keep per-point
+    # formatting and I/O out of the optimization loop.
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"  - Simulating: {params.material.value}, Layers: {params.layers}, Lambda: {params.lambda_nm}nm, Q: {params.Q:.1f}, Gamma: {params.Gamma:.2f} -> Score: {score:.4e}")
+    return score
+
+def _to_params(x) -> Params:
+    """Builds the simulator parameters of a point `x` of the search space."""
+    params_dict = dict(zip([dim.name for dim in space], x))
+    params_dict['material'] = Material(params_dict['material'])
+    return Params(**params_dict)
+
+def objective_batch(xs):
+    """
+    Objective for the optimizer: evaluates the points `xs` with a single
+    vectorized simulate_batch() call and returns -score per point, or
+    (-score, seconds) for a "per second" ACQ_FUNC, the seconds being an equal
+    share of the elapsed time (see ACQ_FUNC).
+    """
+    params_list = [_to_params(x) for x in xs]
+    t0 = time.perf_counter()
+    kpis_list = simulate_batch(params_list, n_I=N_I_SEARCH, kpis_only=True)
+    elapsed = (time.perf_counter() - t0) / len(xs)
+    scores = [-_score(params, kpis) for params, kpis in zip(params_list, kpis_list)]
+    if not ACQ_FUNC.endswith('ps'):
+        return scores
+    return [(score, elapsed) for score in scores]
+
+def _configure_logging(level):
+    """Sends this module's log records to stderr, as bare messages, at `level`."""
+    logging.basicConfig(format="%(message)s")
+    logger.setLevel(level)
+
+def _save_checkpoint(opt: Optimizer):
+    """
+    Saves the points evaluated by `opt` and their results to CHECKPOINT_PATH.
+    Only the evaluations are kept (the surrogate is refitted from them on
+    resume), and the file is written next to the old one and then swapped in,
+    so a crash while saving leaves the previous checkpoint intact.
+    """
+    ys = opt.yi
+    if ACQ_FUNC.endswith('ps'):
+        # The optimizer keeps the log of each evaluation time; store the
+        # seconds, which is what tell() expects back.
+        ys = [[y, float(np.exp(log_t))] for y, log_t in ys]
+    state = {'acq_func': ACQ_FUNC, 'x_iters': opt.Xi, 'y_iters': ys}
+    tmp_path = CHECKPOINT_PATH + ".tmp"
+    dump(state, tmp_path)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+def _resume_from_checkpoint(opt: Optimizer) -> int:
+    """
+    Feeds the evaluations stored in CHECKPOINT_PATH (if any) back into `opt`
+    and returns how many there were. A checkpoint that cannot be read or that
+    does not fit this run is reported and ignored.
+    """
+    if not os.path.exists(CHECKPOINT_PATH):
+        return 0
+    try:
+        state = load(CHECKPOINT_PATH)
+        xs, ys = state['x_iters'], state['y_iters']
+        # "per second" results are (value, seconds) pairs; the two kinds
+        # cannot be converted into each other.
+        if state['acq_func'].endswith('ps') != ACQ_FUNC.endswith('ps'):
+            raise ValueError(f"saved with acq_func={state['acq_func']!r}, not {ACQ_FUNC!r}")
+        if xs:
+            opt.tell(xs, ys)
+    except Exception as exc:
+        print(f"Ignoring checkpoint {CHECKPOINT_PATH} ({type(exc).__name__}: {exc}); "
+              "starting a fresh run")
+        return 0
+    print(f"Resumed {len(xs)} evaluations from {CHECKPOINT_PATH}")
+    return len(xs)
+
+def _pick_best(result):
+    """
+    Re-simulates the N_FINALISTS best evaluated points at full resolution and
+    returns (params, KPIs, score) of the best of them. The search scores come
+    from the coarse N_I_SEARCH grid, so the reported score is recomputed from
+    the same KPIs that are printed and plotted.
+    """
+    order = np.argsort(result.func_vals)[:N_FINALISTS]
+    candidates = [_to_params(result.x_iters[i]) for i in order]
+    kpis_list = simulate_batch(candidates)
+    scores = [_score(params, kpis) for params, kpis in zip(candidates, kpis_list)]
+    best = int(np.argmax(scores))
+    return candidates[best], kpis_list[best], scores[best]
 
 # --- 5. Add a new function for plotting results ---
 def plot_results(result: object, best_kpis: KPIs):
@@ -83,34 +218,54 @@ def plot_results(result: object, best_kpis: KPIs):
     plt.savefig(output_filename)
     print(f"Plots saved to {output_filename}")
 
-def main():
+def main(verbose: bool = False):
     """
     Main function to set up and run the Bayesian Optimization loop.
+    With `verbose`, every evaluated point and its score is logged.
     """
+    _configure_logging(logging.DEBUG if verbose else logging.INFO)
+    # skopt re-draws its (skipped) Sobol sequence on every ask and warns each
+    # time; the design is still valid, so keep it from flooding the output.
+    warnings.filterwarnings("ignore", message="The balance properties of Sobol", category=UserWarning)
     print("Starting Bayesian Optimization...")
 
     # --- 3. Run Optimization Loop ---
-    result = gp_minimize(
-        func=objective_function, 
-        dimensions=space, 
-        n_calls=200, 
-        n_jobs=-1, 
+    # Ask for a batch of points at a time (see ASK_STRATEGY) and evaluate them
+    # together, instead of one simulate() call per surrogate refit.
+    opt = Optimizer(
+        dimensions=space,
+        base_estimator=BASE_ESTIMATOR,
+        acq_func=ACQ_FUNC,
+        # Seed the surrogate with a space-filling Sobol design rather than
+        # uniform random samples, which tend to cluster in 5-D.
+        n_initial_points=16,
+        initial_point_generator='sobol',
+        # With a GP the acquisition function is optimized with L-BFGS from
+        # several random starting points, spread over all cores. Tree models
+        # have no gradients, so the acquisition function is sampled instead.
+        # (Chosen explicitly: skopt's 'auto' wrongly reports gradients once a
+        # "per second" acquisition wraps the tree model.)
+        acq_optimizer='lbfgs' if BASE_ESTIMATOR.upper() == 'GP' else 'sampling',
+        acq_optimizer_kwargs={'n_restarts_optimizer': 10, 'n_jobs': -1},
+        # Only the latest surrogate is used; skopt keeps every refit otherwise.
+        model_queue_size=1,
         random_state=42
     )
+    n_done = _resume_from_checkpoint(opt)
+    result = opt.get_result() if n_done else None
+    while n_done < N_CALLS:
+        xs = opt.ask(n_points=min(BATCH_SIZE, N_CALLS - n_done),
+                     strategy=ASK_STRATEGY)
+        ys = objective_batch(xs)
+        result = opt.tell(xs, ys)
+        n_done += len(xs)
+        _save_checkpoint(opt)
+        print(f"  - Evaluated {n_done}/{N_CALLS} points, best score so far: {-result.fun:.4e}")
 
     print("\n--- Optimization Finished ---")
     
     # --- 4. Process and Display Results ---
-    best_params_list = result.x
-    best_score = -result.fun
-    best_params = Params(
-        material=Material(best_params_list[0]),
-        layers=best_params_list[1],
-        lambda_nm=best_params_list[2],
-        Q=best_params_list[3],
-        Gamma=best_params_list[4]
-    )
-    best_kpis = simulate(best_params)
+    best_params, best_kpis, best_score = _pick_best(result)
 
     if best_params and best_kpis:
         print(f"Best Score: {best_score:.4e}")
@@ -121,7 +276,7 @@ def main():
         print(f"  - Q: {best_params.Q:.1f}")
         print(f"  - Gamma: {best_params.Gamma:.2f}")
         print("\nResulting Performance:")
-        print(f"  - Contrast: {best_kpis.contrast:.3f}")
+        print(f"  - Contrast: {best_kpis.contrast:.3e}")
         print(f"  - T0: {best_kpis.T0:.3f}")
         print(f"  - Knee Intensity: {best_kpis.knee_I:.2e} W/m^2")
         print(f"  - Switching Energy: {best_kpis.E_sw_pJ:.3f} pJ")
@@ -133,4 +288,7 @@ def main():
         print("Optimization failed to find a suitable result.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the Bayesian Optimization.")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="log every evaluated point and its score")
+    main(verbose=parser.parse_args().verbose)
@@ -0,0 +1,81 @@
+"""
+_kernels.py
+
+Compiled (numba) kernels for the simulator's hot path.
+
+`pipeline` fuses the saturable-absorption, Kerr and MZI models from
+`models.py` into a single loop over the intensity grid, so a simulation makes
+one pass over the array with scalar locals instead of one NumPy pass (and
+temporary) per model. The per-element expressions are the same as in
+`models.py`; keep the two in sync when a model changes.
+"""
+
+import math
+import numpy as np
+from numba import njit
+
+from .types import NonlinearEffect
+
+# Effect opcodes of `MaterialProperties.effect_ops`; numba treats these
+# globals as compile-time constants.
+OP_SATURABLE_ABSORPTION = NonlinearEffect.SATURABLE_ABSORPTION.opcode
+OP_KERR = NonlinearEffect.KERR.opcode
+
+@njit(cache=True, fastmath=True, boundscheck=False)
+def pipeline(ops, I, alpha0, alpha_ns, Isat, n2, L_int_m, lambda_m, n_eff, FE, Gamma, out):
+    """
+    Writes the final transmission into `out`. Each intensity point runs the
+    effect opcodes in `ops` (a material's `effect_ops`) in order, as the model
+    pipeline does: absorption effects multiply the transmission, phase effects
+    add to the accumulated phase shift, and the MZI then converts the total
+    phase into transmission once, i.e. T_sa(I) * T_mzi(phi_kerr(I)) when both
+    are active. Inputs of effects not in `ops` are unused. `I` may be float32;
+    the arithmetic is done in float64 scalars and `out` should be float64.
+
+    A new effect is added as an opcode, a case below and its scalar inputs.
+    """
+    # A plain range: at a few hundred points, prange's threading overhead
+    # would outweigh the loop itself.
+    # Loop invariants: the SA model needs I/Isat, and the Kerr phase is linear
+    # in I. Phases are accumulated as half-phases (phi/2), the MZI's argument.
+    inv_Isat = 1.0 / Isat
+    sa_base = 1.0 - alpha_ns
+    half_phase_per_I = 0.5 * (2.0 * math.pi / lambda_m) * n2 * Gamma * L_int_m * FE / n_eff
+    for i in range(I.shape[0]):
+        T = 1.0
+        half_phase = 0.0
+        for k in range(ops.shape[0]):
+            op = ops[k]
+            if op == OP_SATURABLE_ABSORPTION:
+                T *= sa_base - alpha0 / (1.0 + I[i] * inv_Isat)
+            elif op == OP_KERR:
+                half_phase += half_phase_per_I * I[i]
+        c = math.cos(half_phase)
+        out[i] = T * (c * c)
+    return out
+
+@njit(cache=True, fastmath=True, boundscheck=False)
+def pipeline_batch(ops, I, alpha0, alpha_ns, Isat, n2, L_int_m, lambda_m, n_eff, FE, Gamma,
+                   out):
+    """
+    Row-wise `pipeline` for B parameter sets sharing the effects `ops`: every
+    other argument except `I` is a length-B array, and row b of `out` (shape
+    (B, len(I))) receives the response of parameter set b.
+    """
+    for b in range(out.shape[0]):
+        pipeline(ops, I, alpha0[b], alpha_ns[b], Isat[b], n2[b], L_int_m[b], lambda_m[b],
+                 n_eff[b], FE[b], Gamma[b], out[b])
+    return out
+
+# Compile at import (and populate numba's on-disk cache) for the read-only
+# grid and opcode arrays the simulator passes in, rather than on the first
+# simulate() call.
+_warmup = np.ones(2, dtype=np.float32)
+_warmup.setflags(write=False)
+_ops = np.array([OP_SATURABLE_ABSORPTION, OP_KERR], dtype=np.int8)
+_ops.setflags(write=False)
+pipeline(_ops, _warmup, 0.1, 0.1, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, np.empty(2))
+_ones = np.ones(1)
+pipeline_batch(_ops, _warmup, _ones, _ones, _ones, _ones, _ones, _ones, _ones, _ones, _ones,
+               np.empty((1, 2)))
+del _warmup, _ops, _ones
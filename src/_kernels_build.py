@@ -0,0 +1,71 @@
+"""
+_kernels_build.py
+
+Ahead-of-time build of the compiled kernels in `_kernels.py`.
+
+Running
+
+    python -m src._kernels_build
+
+writes the `_sim_kernels` extension module next to this file. The simulator
+uses it instead of JIT-compiling `_kernels.pipeline` and `pipeline_batch` as
+long as it was built from the current sources (see `source_hash`); a stale
+build is ignored with a warning.
+
+This only shortens a cold start, i.e. one without numba's on-disk cache: the
+rest of the hot path (`models.curve_kpis` and the vectorized models) is still
+compiled or cache-loaded by numba at import, and with a warm cache the JIT
+kernels start as fast and are slightly cheaper per call.
+"""
+
+import hashlib
+import os
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# The kernels and the effect opcodes they interpret.
+_SOURCES = ('_kernels.py', 'types.py')
+
+def source_hash() -> int:
+    """A 63-bit hash of the sources the extension is compiled from."""
+    digest = hashlib.sha256()
+    for name in _SOURCES:
+        with open(os.path.join(_HERE, name), 'rb') as f:
+            digest.update(f.read())
+    return int.from_bytes(digest.digest()[:8], 'little') >> 1
+
+def build():
+    """Compiles the `_sim_kernels` extension into this directory."""
+    from numba.pycc import CC
+    from . import _kernels
+
+    cc = CC('_sim_kernels')
+    cc.output_dir = _HERE
+
+    # Exported for the argument types the simulator passes: the int8 effect
+    # opcodes, the float32 intensity grid, float64 scalars (per-row float64
+    # columns for the batch kernel) and a float64 output buffer.
+    # Both exports call the numba-compiled kernels rather than recompiling their
+    # Python source: pycc has no fastmath option, and this way the AOT build runs
+    # exactly the arithmetic of the JIT path.
+    def _pipeline(ops, I, alpha0, alpha_ns, Isat, n2, L_int_m, lambda_m, n_eff, FE, Gamma, out):
+        return _kernels.pipeline(ops, I, alpha0, alpha_ns, Isat, n2, L_int_m, lambda_m,
+                                 n_eff, FE, Gamma, out)
+
+    cc.export('pipeline',
+              'f8[:](i1[:], f4[:], f8, f8, f8, f8, f8, f8, f8, f8, f8, f8[:])')(_pipeline)
+    cc.export('pipeline_batch',
+              'f8[:, :](i1[:], f4[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], f8[:], '
+              'f8[:], f8[:, :])')(
+        _kernels.pipeline_batch.py_func)
+
+    built_from = source_hash()
+
+    def _source_hash():
+        return built_from
+
+    cc.export('source_hash', 'i8()')(_source_hash)
+    cc.compile()
+
+if __name__ == "__main__":
+    build()
@@ -6,7 +6,6 @@ Values here are placeholders — replace with literature/experimental data.
 """
 
 from .types import Material, MaterialProperties, Sourcing, NonlinearEffect
-from copy import deepcopy
 
 MATERIALS_DATABASE = {
     Material.MOS2: MaterialProperties(
@@ -62,4 +61,5 @@ MATERIALS_DATABASE = {
 }
 
 def get_material(material: Material) -> MaterialProperties:
-    return deepcopy(MATERIALS_DATABASE[material])
\ No newline at end of file
+    """Returns the shared, read-only properties record for `material`."""
+    return MATERIALS_DATABASE[material]
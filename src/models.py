@@ -3,29 +3,61 @@ models.py
 
 Placeholder physics models for the simulator.
 Replace these with your actual, validated physical models.
+
+The element-wise models are compiled to NumPy ufuncs with numba, so each one
+evaluates its whole expression in a single pass over the intensity array
+(no intermediate temporaries) while still broadcasting like plain NumPy.
+Because they are ufuncs, their arguments must be passed positionally.
 """
 
+import math
 import numpy as np
+from numba import njit, vectorize
+
+_F8_4 = ['float64(float64, float64, float64, float64)']
+_F8_6 = ['float64(float64, float64, float64, float64, float64, float64)']
 
+@vectorize(_F8_4, cache=True, fastmath=True)
 def sa_T(I, alpha0, alpha_ns, Isat):
     """A simple model for a saturable absorber's transmission."""
-    return 1 - (alpha0 / (1 + I / Isat) + alpha_ns)
+    return 1.0 - (alpha0 / (1.0 + I / Isat) + alpha_ns)
 
+def sa_kpis_analytic(I_lo, I_hi, alpha0, alpha_ns, Isat, frac=0.5):
+    """
+    Closed-form (T(I_lo), contrast, knee intensity) of `sa_T` over the
+    intensity range [I_lo, I_hi], with the knee defined as in
+    `knee_intensity_by_fraction` but solved exactly instead of on a grid.
+    """
+    # sa_T is linear in u = 1 / (1 + I/Isat), which is monotone in I.
+    u_lo = 1.0 / (1.0 + I_lo / Isat)
+    u_hi = 1.0 / (1.0 + I_hi / Isat)
+    T_lo = 1.0 - (alpha0 * u_lo + alpha_ns)
+    if alpha0 == 0:
+        return T_lo, 0.0, I_lo
+    # Interpolate u from the low-T end of the range (I_lo when alpha0 > 0).
+    u_start, u_end = (u_lo, u_hi) if alpha0 > 0 else (u_hi, u_lo)
+    u_knee = u_start + frac * (u_end - u_start)
+    return T_lo, abs(alpha0) * (u_lo - u_hi), Isat * (1.0 / u_knee - 1.0)
+
+@vectorize(_F8_4, cache=True, fastmath=True)
 def photoconductor_R(I, R_dark, R_light, I_half):
     """A simple model for a photoconductor's resistance."""
-    return R_dark / (1 + (R_dark/R_light - 1) * I / I_half)
+    return R_dark / (1.0 + (R_dark/R_light - 1.0) * I / I_half)
 
+@vectorize(_F8_6, cache=True, fastmath=True)
 def kerr_phi(I, n2, L_int_m, lambda_m, n_eff, field_enhance):
     """A simple model for Kerr effect phase shift."""
-    return (2 * np.pi / lambda_m) * n2 * I * L_int_m * field_enhance / n_eff
+    return (2.0 * math.pi / lambda_m) * n2 * I * L_int_m * field_enhance / n_eff
 
+@vectorize(['float64(float64)'], cache=True, fastmath=True)
 def mzi_T_from_phase(phi):
     """Model for a Mach-Zehnder Interferometer's transmission from phase."""
-    return np.cos(phi / 2)**2
+    c = math.cos(0.5 * phi)
+    return c * c
 
 def calculate_n_from_sellmeier(coeffs: dict, lambda_um: float) -> float:
     """Calculates refractive index n using the Sellmeier equation."""
-    lambda_sq = lambda_um**2
+    lambda_sq = lambda_um * lambda_um
     n_sq = 1.0
     for B, C in coeffs.items():
         n_sq += (B * lambda_sq) / (lambda_sq - C)
@@ -41,10 +73,89 @@ def layers_to_total_thickness(layer_thickness_nm, layers):
 
 def contrast(y):
     """Calculates the contrast of a response curve."""
-    return np.max(y) - np.min(y)
+    return (np.max(y) - np.min(y)).item()
 
 def knee_intensity_by_fraction(I, y, frac=0.5):
     """Finds the intensity at which the response reaches a fraction of its max value."""
-    target = np.min(y) + frac * (np.max(y) - np.min(y))
-    return I[np.argmin(np.abs(y - target))]
+    # curve_kpis returns native Python floats (numba boxes float64 scalars).
+    return curve_kpis(np.asarray(I, dtype=float), np.asarray(y, dtype=float), frac)[2]
+
+@njit(cache=True)
+def curve_kpis(I, y, frac=0.5):
+    """
+    Computes (y[0], contrast, knee intensity) of a response curve in one
+    compiled pass. The knee is where the response crosses
+    `min + frac * (max - min)`, interpolated linearly in log(I) between the
+    grid points around the crossing, so coarse grids still resolve it.
+    """
+    y_min = y[0]
+    y_max = y[0]
+    increasing = True
+    for i in range(1, y.size):
+        if y[i] < y_min:
+            y_min = y[i]
+        elif y[i] > y_max:
+            y_max = y[i]
+        if y[i] < y[i - 1]:
+            increasing = False
+    target = y_min + frac * (y_max - y_min)
+
+    if increasing:
+        # Monotone curve (e.g. pure saturable absorption): binary search for
+        # the first point at or above the target; the crossing lies between
+        # it and its predecessor.
+        lo, hi = 0, y.size - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if y[mid] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return y[0], y_max - y_min, float(I[0])
+        return y[0], y_max - y_min, _interp_log_I(I, y, lo - 1, lo, target)
+
+    # Non-monotone curve (e.g. an oscillating MZI response): the response may
+    # cross the target several times. Take the grid point closest to the
+    # target, as on a fine grid, and report the crossing nearest to it. A
+    # crossing is an interval whose end points bracket the target; the closest
+    # point itself need not be next to one (e.g. on a flat stretch of a coarse
+    # grid), but the knee always lies inside a bracketing interval.
+    knee_idx = 0
+    best = abs(y[0] - target)
+    for i in range(1, y.size):
+        d = abs(y[i] - target)
+        if d < best:
+            best = d
+            knee_idx = i
+    lo = -1
+    lo_dist = y.size
+    for i in range(y.size - 1):
+        if (y[i] - target) * (y[i + 1] - target) <= 0.0 and y[i] != y[i + 1]:
+            dist = min(abs(i - knee_idx), abs(i + 1 - knee_idx))
+            if dist < lo_dist:
+                lo = i
+                lo_dist = dist
+    if lo < 0:
+        # Flat curve: every point is at the target.
+        return y[0], y_max - y_min, float(I[0])
+    return y[0], y_max - y_min, _interp_log_I(I, y, lo, lo + 1, target)
+
+@njit(cache=True)
+def _interp_log_I(I, y, a, b, target):
+    """Intensity between grid points a and b where y reaches `target`, linear in log(I)."""
+    t = (target - y[a]) / (y[b] - y[a])
+    log_a = math.log(float(I[a]))
+    return math.exp(log_a + t * (math.log(float(I[b])) - log_a))
 
+# Compile at import (and populate numba's on-disk cache) for the argument
+# types the simulator passes: the read-only float32 grid and a float64
+# response. Otherwise each process would pay the compile or cache load on its
+# first simulation, and that one-off time would be measured as the cost of the
+# point being evaluated (see ACQ_FUNC in main.py). The vectorized models above
+# are compiled eagerly by their signatures already.
+_warmup = np.ones(2, dtype=np.float32)
+_warmup.setflags(write=False)
+curve_kpis(_warmup, np.array([0.0, 1.0]), 0.5)
+curve_kpis(_warmup, np.array([1.0, 0.0]), 0.5)
+del _warmup
@@ -5,42 +5,218 @@ This module contains the core simulation logic.
 
 This version uses a flexible, data-driven pipeline where the physical effects
 to be simulated are determined by the `active_effects` list in the material's
-properties, rather than a rigid if/elif structure.
+properties, rather than a rigid if/elif structure. Single simulations run the
+effects through the fused, compiled kernel in `_kernels.py` (or its
+ahead-of-time build, see `_kernels_build.py`).
 """
 
+import warnings
 import numpy as np
-from .types import Params, KPIs, Curve, Material, NonlinearEffect
+from collections import OrderedDict
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from .types import Params, KPIs, KPIValues, Curve, NonlinearEffect, Spectrum
 from .materials import MATERIALS_DATABASE
-from .models import (
-    sa_T, kerr_phi, mzi_T_from_phase,
-    small_signal_absorption_from_k, layers_to_total_thickness,
-    contrast as kpi_contrast, knee_intensity_by_fraction
-)
-
-def get_wavelength_dependent_value(prop: dict, lambda_nm: int):
-    """Finds the value for the closest wavelength in the dictionary."""
+from ._kernels_build import source_hash
+from .models import sa_T, curve_kpis, sa_kpis_analytic, calculate_n_from_sellmeier
+
+def _load_aot_kernels():
+    """
+    Returns the ahead-of-time build of `_kernels` (see `_kernels_build.py`) if
+    it is present and was built from the current sources, otherwise None.
+    """
+    try:
+        from . import _sim_kernels
+    except ImportError:
+        return None
+    built_from = getattr(_sim_kernels, 'source_hash', None)
+    if built_from is None or built_from() != source_hash():
+        warnings.warn("src/_sim_kernels is out of date with src/_kernels.py; using the JIT "
+                      "kernels. Rebuild it with `python -m src._kernels_build`.")
+        return None
+    return _sim_kernels
+
+_aot = _load_aot_kernels()
+if _aot is not None:
+    pipeline, pipeline_batch = _aot.pipeline, _aot.pipeline_batch
+else:
+    from ._kernels import pipeline, pipeline_batch
+
+_SA_FLAG = NonlinearEffect.SATURABLE_ABSORPTION.flag
+_KERR_FLAG = NonlinearEffect.KERR.flag
+
+@lru_cache(maxsize=None)
+def _grid(n_I: int) -> np.ndarray:
+    """
+    Intensity sweep with `n_I` points over [1e2, 1e8] W/m^2, shared by every
+    simulation at that resolution. It is marked read-only so that no model or
+    caller can modify the shared array in place. The grid is stored in float32
+    (7 significant digits is plenty for an intensity axis); responses are
+    computed in float64, see `_scratch`.
+    """
+    grid = np.logspace(2, 8, n_I, dtype=np.float32)
+    grid.setflags(write=False)
+    return grid
+
+@lru_cache(maxsize=None)
+def _scratch(n_I: int) -> np.ndarray:
+    """
+    Output buffer reused by every single-point simulation at resolution `n_I`.
+    Nothing holds on to it between calls: KPIs are reduced from it immediately
+    and returned curves are copies. (Not thread-safe; parallel runs use
+    separate processes.) Responses stay float64: thin devices have T within
+    ~1e-7 of 1, below the resolution of float32 there, so their contrast would
+    be lost.
+    """
+    return np.empty(n_I, dtype=np.float64)
+
+# Unit conversions and the fixed device footprint (10 um x 10 um) used for the
+# switching energy.
+_NM_TO_M = 1e-9
+_NM_TO_UM = 1e-3
+_UM_TO_M = 1e-6
+_J_TO_PJ = 1e12
+_AREA_M2 = 1e-10
+
+def get_wavelength_dependent_value(prop: Optional[Spectrum], lambda_nm: float):
+    """Interpolates the property at `lambda_nm`; None if it has no data."""
     if not prop:
         return None
-    closest_lambda = min(prop.keys(), key=lambda k: abs(k - lambda_nm))
-    return prop[closest_lambda]
+    return prop.at(lambda_nm)
 
-def simulate(params: Params) -> KPIs:
+def simulate(params: Params, n_I: int = 300) -> KPIs:
     """
-    This is the main simulation function.
-    It checks the material's `active_effects` list and applies each physical
-    model in a pipeline to determine the final device response.
+    Runs the simulation for `params`, reusing the result of any earlier call
+    with identical parameters. The returned KPIs are shared between callers
+    and must not be modified.
+
+    `n_I` is the number of points of the intensity sweep. The knee is
+    interpolated between grid points, so a coarse grid (~64 points) gives
+    accurate KPIs for optimization; plots want the default resolution.
     """
-    props = MATERIALS_DATABASE[params.material]
-    I = np.logspace(2, 8, 300)  # W/m^2
-    lambda_m = params.lambda_nm * 1e-9
-    lambda_um = params.lambda_nm * 1e-3 # for Sellmeier
-    t_total = layers_to_total_thickness(props.layer_thickness_nm, params.layers)
+    return _cached((params, n_I, False), _simulate, params, n_I)
+
+def simulate_kpis_only(params: Params, n_I: int = 300) -> KPIValues:
+    """
+    Like `simulate`, but returns only the scalar KPIs. No response curve is
+    built or kept, and closed-form models skip the intensity sweep entirely;
+    use this when the curve is not needed, e.g. inside the optimization loop.
+    """
+    return _cached((params, n_I, True), _simulate_kpis_only, params, n_I)
+
+def simulate_batch(params_list, n_I: int = 300, kpis_only: bool = False) -> list:
+    """
+    Simulates many parameter sets at once and returns their KPIs in order:
+    `KPIs` as from `simulate`, or `KPIValues` as from `simulate_kpis_only`
+    if `kpis_only` is set.
+
+    Points are grouped by material and each group is evaluated by one call
+    of the compiled pipeline over a (points x intensities) array, so the
+    per-call Python and dispatch overhead is paid once per group rather than
+    per point. The KPIs are the same as simulating each point on its own, and
+    points simulated before (by any of the three functions, at the same `n_I`)
+    are served from the shared cache; only the others are simulated.
+    """
+    results = [_results.get((params, n_I, kpis_only)) for params in params_list]
+    groups = {}
+    for i, params in enumerate(params_list):
+        if results[i] is None:
+            groups.setdefault(params.material, []).append(i)
+
+    I = _grid(n_I)
+    for material, idxs in groups.items():
+        props = MATERIALS_DATABASE[material]
+        group = [params_list[i] for i in idxs]
+
+        if props.effect_mask == _SA_FLAG:
+            # Closed form per point, as in `simulate`.
+            single = _simulate_kpis_only if kpis_only else _simulate
+            for i, params in zip(idxs, group):
+                results[i] = single(params, n_I)
+                _results.put((params, n_I, kpis_only), results[i])
+            continue
+
+        # Per-point scalars as length-B columns; the kernel runs the same fused
+        # pipeline as `simulate` on each row.
+        do_kerr = bool(props.effect_mask & _KERR_FLAG)
+        # (Transposed to contiguous rows: the kernel is compiled for C-layout
+        # columns at import, a strided view would compile another version.)
+        resolved = [_resolve(material, p.lambda_nm, p.layers, p.L_int_um) for p in group]
+        r = _Resolved(*np.ascontiguousarray(np.array(resolved, dtype=np.float64).T))
+        if do_kerr:
+            Gamma, FE = np.ascontiguousarray(np.array([_geometry_terms(p) for p in group]).T)
+        else:
+            Gamma = FE = np.ones(len(group))
+
+        T_final = pipeline_batch(props.effect_ops, I, r.alpha0, r.alpha_ns, r.Isat, r.n2,
+                                 r.L_int_m, r.lambda_m, r.n_eff, FE, Gamma,
+                                 np.empty((len(group), I.size), dtype=np.float64))
+
+        # Row-wise KPIs with the same single-pass reduction as `simulate`.
+        for row, i in enumerate(idxs):
+            T0, C, knee = curve_kpis(I, T_final[row], 0.5)
+            values = _make_kpi_values(resolved[row].tau_s, T0, C, knee)
+            results[i] = values if kpis_only else _make_kpis(values, _make_curve(I, T_final[row]))
+            _results.put((group[row], n_I, kpis_only), results[i])
+    return results
+
+class _ResultCache:
+    """
+    Bounded least-recently-used map from (params, n_I, kpis_only) to the
+    simulation results; frozen `Params` are hashable keys. Unlike
+    functools.lru_cache it can be looked up without computing the value, which
+    lets `simulate_batch` simulate only the points it has not seen yet.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        """Returns the cached result for `key`, or None."""
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+_results = _ResultCache(maxsize=4096)
+
+def _cached(key, compute, params, n_I):
+    """Returns the cached result for `key`, computing and storing it on a miss."""
+    value = _results.get(key)
+    if value is None:
+        value = compute(params, n_I)
+        _results.put(key, value)
+    return value
+
+class _Spectral(NamedTuple):
+    """A material's wavelength-dependent scalars at one wavelength."""
+    n_eff: Optional[float]  # effective linear index (Kerr path)
+    n2: Optional[float]     # nonlinear index [m^2/W]
+    k: Optional[float]      # extinction coefficient
+    Isat: Optional[float]   # saturation intensity [W/m^2]
+
+@lru_cache(maxsize=4096)
+def _resolve_wavelength(material, lambda_nm) -> _Spectral:
+    """
+    Resolves the wavelength tables of `material` at `lambda_nm` once; later
+    simulations at the same wavelength read plain floats from the cache.
+    """
+    props = MATERIALS_DATABASE[material]
+    lambda_um = lambda_nm * _NM_TO_UM # for Sellmeier
 
     # --- Wavelength-dependent parameters ---
-    n = get_wavelength_dependent_value(props.n, params.lambda_nm)
-    k = get_wavelength_dependent_value(props.k, params.lambda_nm)
-    n2 = get_wavelength_dependent_value(props.n2, params.lambda_nm)
-    Isat = get_wavelength_dependent_value(props.Isat_W_m2, params.lambda_nm)
+    n = get_wavelength_dependent_value(props.n, lambda_nm)
 
     # --- Refractive Index Calculation ---
     n_effective = n
@@ -52,70 +228,145 @@ def simulate(params: Params) -> KPIs:
         # For now, we'll assume the user provides the correct effective index.
         pass
 
+    return _Spectral(
+        n_eff=n_effective,
+        n2=get_wavelength_dependent_value(props.n2, lambda_nm),
+        k=get_wavelength_dependent_value(props.k, lambda_nm),
+        Isat=get_wavelength_dependent_value(props.Isat_W_m2, lambda_nm),
+    )
+
+class _Resolved(NamedTuple):
+    """
+    Kernel inputs and KPI constants of one device, in SI units. Inputs of
+    inactive effects hold neutral values (no loss, no phase) so that the
+    kernel call stays well-typed.
+    """
+    lambda_m: float
+    L_int_m: float
+    alpha0: float    # saturable part of the small-signal absorption
+    alpha_ns: float  # non-saturable part
+    Isat: float      # saturation intensity [W/m^2]
+    n_eff: float
+    n2: float        # [m^2/W]
+    tau_s: float     # response time used for the switching energy
+
+@lru_cache(maxsize=4096)
+def _resolve(material, lambda_nm, layers, L_int_um) -> _Resolved:
+    """
+    Resolves everything a simulation needs apart from the continuous geometry
+    knobs (Q, Gamma). These only depend on the discrete device coordinates, so
+    each combination is computed once and then looked up.
+    """
+    props = MATERIALS_DATABASE[material]
+    spectral = _resolve_wavelength(material, lambda_nm)
+    lambda_m = lambda_nm * _NM_TO_M
+
+    alpha0, alpha_ns, Isat = 0.0, 0.0, 1.0
+    if props.effect_mask & _SA_FLAG:
+        # --- Saturable Absorption: small-signal absorption split into
+        # saturable and non-saturable parts ---
+        # Same formulas as layers_to_total_thickness and
+        # small_signal_absorption_from_k in models.py, inlined.
+        t_total = props.layer_thickness_nm * _NM_TO_M * layers
+        if props.linear_absorption_coefficient is not None:
+            A0 = props.linear_absorption_coefficient * t_total
+        else:
+            A0 = (4 * np.pi * spectral.k / lambda_m) * t_total
+
+        f_sat = props.saturable_fraction if props.saturable_fraction is not None else 0.6
+        alpha0 = f_sat * A0
+        alpha_ns = (1.0 - f_sat) * A0
+        Isat = spectral.Isat
+
+    n_eff, n2 = 1.0, 0.0
+    if props.effect_mask & _KERR_FLAG:
+        n_eff, n2 = spectral.n_eff, spectral.n2
+
+    tau = props.tau_s if props.tau_s is not None else 1e-9 # Default to 1ns if not specified
+    return _Resolved(lambda_m=lambda_m, L_int_m=L_int_um * _UM_TO_M,
+                     alpha0=alpha0, alpha_ns=alpha_ns, Isat=Isat,
+                     n_eff=n_eff, n2=n2, tau_s=tau)
+
+def _geometry_terms(params: Params):
+    """Returns (Gamma, field enhancement) from the geometry knobs."""
+    Gamma = max(0.0, float(params.Gamma))
+    FE = 1.0 + 0.002 * max(0.0, float(params.Q))
+    return Gamma, FE
+
+def _simulate(params: Params, n_I: int = 300) -> KPIs:
+    """Simulates `params` and packs the KPIs together with the response curve."""
+    T0, C, knee, tau, T_final = _simulate_core(params, n_I, keep_curve=True)
+    values = _make_kpi_values(tau, T0, C, knee)
+    return _make_kpis(values, _make_curve(_grid(n_I), T_final))
+
+def _simulate_kpis_only(params: Params, n_I: int = 300) -> KPIValues:
+    """Simulates `params` and returns the scalar KPIs only."""
+    T0, C, knee, tau, _ = _simulate_core(params, n_I, keep_curve=False)
+    return _make_kpi_values(tau, T0, C, knee)
+
+def _simulate_core(params: Params, n_I: int, keep_curve: bool):
+    """
+    This is the main simulation function.
+    It checks the material's `active_effects` list and applies each physical
+    model in a pipeline to determine the final device response.
+
+    Returns (T0, contrast, knee, tau, T_final). T_final is the response on
+    `_grid(n_I)`, held in the shared scratch buffer (copy it before the next
+    simulation); it may be None when `keep_curve` is False.
+    """
+    props = MATERIALS_DATABASE[params.material]
+    r = _resolve(params.material, params.lambda_nm, params.layers, params.L_int_um)
+    I = _grid(n_I)
+
+    # --- Closed-form Shortcut ---
+    # A device with only saturable absorption has an analytic response, so its
+    # KPIs follow directly from the model and the sweep is only needed for the
+    # returned curve.
+    if props.effect_mask == _SA_FLAG:
+        T0, C, knee = sa_kpis_analytic(float(I[0]), float(I[-1]), r.alpha0, r.alpha_ns, r.Isat, 0.5)
+        T_final = None
+        if keep_curve:
+            T_final = sa_T(I, r.alpha0, r.alpha_ns, r.Isat, out=_scratch(n_I))
+        return T0, C, knee, r.tau_s, T_final
+
     # --- Simulation Pipeline ---
-    # Initialize baseline transmission and phase. We start with a perfectly
-    # transparent device with no phase shift.
-    total_transmission = np.ones_like(I, dtype=float)
-    total_phase_shift = np.zeros_like(I, dtype=float)
-
-    # Loop through the active effects defined for the material and apply them.
-    for effect in props.active_effects:
-
-        if effect == NonlinearEffect.SATURABLE_ABSORPTION:
-            # --- Apply Saturable Absorption Effect ---
-            # This effect modifies the device's transmission (loss).
-            if props.linear_absorption_coefficient is not None:
-                A0 = props.linear_absorption_coefficient * t_total
-            else:
-                A0 = small_signal_absorption_from_k(k, lambda_m, t_total)
-            
-            f_sat = props.saturable_fraction if props.saturable_fraction is not None else 0.6
-            alpha0 = f_sat * A0
-            alpha_ns = (1.0 - f_sat) * A0
-            
-            # This transmission is multiplied with the running total.
-            total_transmission *= sa_T(I, alpha0=alpha0, alpha_ns=alpha_ns, Isat=Isat)
-
-        elif effect == NonlinearEffect.KERR:
-            # --- Apply Kerr Effect ---
-            # This effect modifies the phase of the light.
-            Gamma = max(0.0, float(params.Gamma))
-            FE = 1.0 + 0.002 * max(0.0, float(params.Q))
-            
-            # This phase shift is added to the running total.
-            total_phase_shift += kerr_phi(I * Gamma, n2=n2, L_int_m=params.L_int_um * 1e-6,
-                                        lambda_m=lambda_m, field_enhance=FE, n_eff=n_effective)
-
-    # --- Combine Effects ---
-    # After all effects are accumulated, we convert the final phase shift into
-    # a transmission change using a device model (e.g., an MZI).
-    T_from_phase = mzi_T_from_phase(total_phase_shift)
-    
-    # The final response is the product of the transmission from absorption effects
-    # and the transmission from phase effects.
-    T_final = total_transmission * T_from_phase
+    # The material's active effects, as opcodes (`effect_ops`), select which
+    # stages of the compiled pipeline run, in order; the kernel evaluates the
+    # whole chain (SA loss, Kerr phase, MZI) per intensity point in a single
+    # pass. The final response is the product of the transmission from
+    # absorption effects and the MZI transmission of the accumulated phase
+    # shift.
+    do_kerr = bool(props.effect_mask & _KERR_FLAG)
+    Gamma, FE = _geometry_terms(params) if do_kerr else (1.0, 1.0)
+    T_final = pipeline(props.effect_ops, I, r.alpha0, r.alpha_ns, r.Isat, r.n2, r.L_int_m,
+                       r.lambda_m, r.n_eff, FE, Gamma, _scratch(n_I))
 
     # --- Calculate Final KPIs ---
-    # The KPIs are calculated based on the final, combined response curve.
-    curve = Curve(I=I, y=T_final, kind='T')
-    T0 = float(T_final[0])
-    C = kpi_contrast(T_final)
-    
     # For the knee, we have a choice. We can use the simple fractional method,
     # or for phase-based devices, calculate the intensity for a specific phase shift.
     # We'll use the fractional method for simplicity here on the final curve.
-    knee = knee_intensity_by_fraction(I, T_final, frac=0.5)
-    
-    tau = props.tau_s if props.tau_s is not None else 1e-9 # Default to 1ns if not specified
-    area_m2 = (10e-6) * (10e-6)
-    Esw_pJ = 1e12 * knee * area_m2 * tau
-
-    return KPIs(
-        contrast=float(C),
-        T0=float(T0),
-        knee_I=float(knee),
-        E_sw_pJ=float(Esw_pJ),
-        tau_s=float(tau),
-        curve=curve
-    )
+    # T0, contrast and knee are all read off the curve in one compiled pass.
+    T0, C, knee = curve_kpis(I, T_final, 0.5)
+    return T0, C, knee, r.tau_s, T_final
+
+def _make_curve(I, y) -> Curve:
+    """
+    Packs a transmission curve with its own copy of the response. The
+    response stays float64: thin devices have T within ~1e-7 of 1, which
+    float32 would quantize into a few steps. The read-only float32 grid is
+    shared rather than copied.
+    """
+    return Curve(I=I, y=np.array(y, dtype=np.float64), kind='T')
+
+def _make_kpi_values(tau, T0, C, knee) -> KPIValues:
+    """
+    Derives the timing/energy KPIs and packs the scalars into `KPIValues`.
+    The inputs are native Python floats (curve_kpis, sa_kpis_analytic and
+    _resolve all return them), so no conversions are needed here.
+    """
+    Esw_pJ = _J_TO_PJ * knee * _AREA_M2 * tau
+    return KPIValues(contrast=C, T0=T0, knee_I=knee, E_sw_pJ=Esw_pJ, tau_s=tau)
 
+def _make_kpis(values: KPIValues, curve: Curve) -> KPIs:
+    """Attaches the response curve to the scalar KPIs."""
+    return KPIs(*values, curve=curve)
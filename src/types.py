@@ -4,9 +4,10 @@ types.py
 Define a class for materials to store its properties for simulation.
 """
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from enum import Enum
-from typing import List, Literal, Optional, Tuple
+from types import MappingProxyType
+from typing import Literal, Mapping, NamedTuple, Optional, Tuple
 import numpy as np
 
 class Material(str, Enum):
@@ -24,10 +25,29 @@ class NonlinearEffect(str, Enum):
     SATURABLE_ABSORPTION = "Saturable Absorption"
     KERR = "Kerr Effect"
 
+    @property
+    def flag(self) -> int:
+        """Bit identifying this effect in `MaterialProperties.effect_mask`."""
+        return _EFFECT_FLAGS[self]
+
+    @property
+    def opcode(self) -> int:
+        """Code of this effect in `MaterialProperties.effect_ops`."""
+        return _EFFECT_OPCODES[self]
+
+_EFFECT_FLAGS = {effect: 1 << i for i, effect in enumerate(NonlinearEffect)}
+# The single definition of the effect opcodes; the compiled pipeline in
+# _kernels.py reads them from here. Append new effects rather than
+# renumbering.
+_EFFECT_OPCODES = {
+    NonlinearEffect.SATURABLE_ABSORPTION: 1,
+    NonlinearEffect.KERR: 2,
+}
+
 """
 Input parameters for simulation.
 """
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Params:
     material: Material
     layers: int 
@@ -40,17 +60,26 @@ class Params:
 """
 Curve class to store the data of the curves.
 """
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Curve:
     
     I: np.ndarray # Intensity grid
     y: np.ndarray # response
     kind: Literal['T', 'R', 'phi']
 
+    def __post_init__(self):
+        # Freezing the dataclass does not stop in-place writes to the arrays;
+        # keep read-only views so curves shared through the simulate() cache
+        # cannot be modified by one caller under another.
+        for name in ('I', 'y'):
+            view = np.asarray(getattr(self, name)).view()
+            view.setflags(write=False)
+            object.__setattr__(self, name, view)
+
 """
 Key Performance Indicators (KPIs)
 """
-@dataclass
+@dataclass(frozen=True, slots=True)
 class KPIs:
     contrast: float        # y(high) - y(low) on a defined range
     T0: float              # baseline (for T-kind) else np.nan
@@ -59,25 +88,87 @@ class KPIs:
     tau_s: float           # response time (s)
     curve: Curve # type: ignore
 
-@dataclass(frozen=True)
+"""
+The scalar KPIs without the response curve, in the same order as `KPIs`.
+"""
+class KPIValues(NamedTuple):
+    contrast: float
+    T0: float
+    knee_I: float
+    E_sw_pJ: Optional[float]
+    tau_s: float
+
+"""
+Wavelength-dependent material property, sampled at a few wavelengths.
+"""
+@dataclass(frozen=True, slots=True)
+class Spectrum:
+    lambdas_nm: np.ndarray # sample wavelengths, ascending
+    values: np.ndarray     # property value at each sample wavelength
+
+    @classmethod
+    def from_mapping(cls, table: Mapping[float, float]) -> "Spectrum":
+        """Builds a spectrum from a {lambda_nm: value} table."""
+        lambdas = np.array(sorted(table), dtype=float)
+        values = np.array([table[lam] for lam in sorted(table)], dtype=float)
+        lambdas.setflags(write=False)
+        values.setflags(write=False)
+        return cls(lambdas_nm=lambdas, values=values)
+
+    def __len__(self) -> int:
+        return self.lambdas_nm.size
+
+    def at(self, lambda_nm: float) -> float:
+        """Linearly interpolates the value at `lambda_nm` (clamped at the ends)."""
+        return float(np.interp(lambda_nm, self.lambdas_nm, self.values))
+
+@dataclass(frozen=True, slots=True)
 class MaterialProperties:
     name: Material
     sourcing: Sourcing
     active_effects: Tuple[NonlinearEffect, ...] # The list of active effects for this material
     layer_thickness_nm: float  # single-layer thickness in nm
     
-    # Wavelength-dependent properties (dictionary mapping lambda_nm to value)
-    n: dict[int, float]                   # real refractive index
-    k: dict[int, float]                   # extinction coefficient (imag part)
-    n2: dict[int, float]                  # nonlinear index [m^2/W] (Kerr path)
-    Isat_W_m2: dict[int, float]   # Saturation intensity for SA/PC if known
+    # Wavelength-dependent properties, given as {lambda_nm: value} dicts and
+    # stored as Spectrum tables
+    n: Spectrum                   # real refractive index
+    k: Spectrum                   # extinction coefficient (imag part)
+    n2: Spectrum                  # nonlinear index [m^2/W] (Kerr path)
+    Isat_W_m2: Spectrum   # Saturation intensity for SA/PC if known
 
     # Other properties
     linear_absorption_coefficient: Optional[float] = None # linear absorption coefficient [m^-1]
     anisotropy_type: Optional[str] = None # e.g., 'uniaxial'
-    n_ordinary: Optional[dict[int, float]] = None # ordinary refractive index
-    n_extraordinary: Optional[dict[int, float]] = None # extraordinary refractive index
-    sellmeier_coefficients: Optional[dict] = None # Sellmeier coefficients for dispersion
+    n_ordinary: Optional[Spectrum] = None # ordinary refractive index
+    n_extraordinary: Optional[Spectrum] = None # extraordinary refractive index
+    sellmeier_coefficients: Optional[Mapping] = None # Sellmeier coefficients for dispersion
     tau_s: Optional[float] = None       # Response time [s]
     saturable_fraction: Optional[float] = None  # Fraction of low-intensity absorption that saturates (0..1)
-    references: dict[str, str] = field(default_factory=dict) # a dict to store references for the data
\ No newline at end of file
+    references: Mapping[str, str] = field(default_factory=dict) # a dict to store references for the data
+
+    # Derived: OR of the `flag` of every active effect, so the simulator can
+    # test for an effect with one integer AND instead of scanning the tuple.
+    effect_mask: int = field(init=False, default=0)
+    effect_ops: np.ndarray = field(init=False, default=None) # int8 opcodes of active_effects, in order
+
+    def __post_init__(self):
+        # Turn the wavelength tables into sorted arrays, and wrap every other
+        # dict field in a read-only view, so a single instance can be shared
+        # by all callers instead of being deep-copied on each access.
+        for f in fields(self):
+            value = getattr(self, f.name)
+            if not isinstance(value, dict):
+                continue
+            if f.name in _SPECTRUM_FIELDS:
+                object.__setattr__(self, f.name, Spectrum.from_mapping(value))
+            else:
+                object.__setattr__(self, f.name, MappingProxyType(value))
+        mask = 0
+        for effect in self.active_effects:
+            mask |= effect.flag
+        object.__setattr__(self, 'effect_mask', mask)
+        ops = np.array([effect.opcode for effect in self.active_effects], dtype=np.int8)
+        ops.setflags(write=False)
+        object.__setattr__(self, 'effect_ops', ops)
+
+_SPECTRUM_FIELDS = ('n', 'k', 'n2', 'Isat_W_m2', 'n_ordinary', 'n_extraordinary')
@@ -0,0 +1,25 @@
+"""
+Regression checks for the knee read off coarse intensity grids.
+"""
+
+import numpy as np
+
+from src.models import curve_kpis
+from src.simulator import simulate_kpis_only
+from src.types import Params, Material
+
+def test_coarse_grid_knee_matches_full_resolution():
+    # A nearly flat response whose only crossing is at the top of the sweep:
+    # on the 64-point grid the sample closest to the target used to be I[0].
+    params = Params(material=Material.WS2, layers=4, lambda_nm=1329, Q=983.65, Gamma=0.07353)
+    coarse = simulate_kpis_only(params, n_I=64)
+    fine = simulate_kpis_only(params, n_I=300)
+    assert abs(coarse.knee_I / fine.knee_I - 1.0) < 0.02
+
+def test_knee_lies_in_a_bracketing_interval():
+    # Non-monotone; y[0] is the sample closest to the target (0.5) but neither
+    # of its neighbours brackets it. The only crossing is between I=1e3 and 1e4.
+    I = np.logspace(0, 4, 5).astype(np.float32)
+    y = np.array([0.49, 0.0, 0.0, 0.0, 1.0])
+    _, _, knee = curve_kpis(I, y, 0.5)
+    assert 1e3 < knee < 1e4